@@ -0,0 +1,94 @@
+"""Helpers for the batch prediction endpoints.
+
+A batch body is either a JSON list of records, or a CSV / Parquet file
+posted as the raw request body (``Content-Type: text/csv`` or
+``application/vnd.apache.parquet``). It is turned into one DataFrame with the
+columns and defaults of the endpoint's pydantic input model, scored chunk by
+chunk and streamed back as NDJSON, one line per input row.
+"""
+import asyncio
+import io
+import json
+import os
+import numpy as np
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter, ValidationError
+
+from projects.common.startup import lazy_import
+
+pd = lazy_import("pandas")
+
+CHUNK_SIZE = int(os.environ.get("BATCH_CHUNK_SIZE", "5000"))
+PARQUET_TYPES = ("application/vnd.apache.parquet", "application/x-parquet", "application/octet-stream")
+
+
+async def read_frame(request, schema):
+    """Parse the request body into a DataFrame shaped like `schema`, on a worker thread."""
+    ctype = request.headers.get("content-type", "application/json").split(";")[0].strip()
+    body = await request.body()
+    return await asyncio.to_thread(parse_frame, body, ctype, schema)
+
+
+def parse_frame(body, ctype, schema):
+    try:
+        if ctype == "text/csv":
+            df = pd.read_csv(io.BytesIO(body))
+        elif ctype in PARQUET_TYPES:
+            df = pd.read_parquet(io.BytesIO(body))
+        else:
+            records = TypeAdapter(list[schema]).validate_json(body)
+            return pd.DataFrame([r.model_dump() for r in records], columns=list(schema.model_fields))
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+    except (ValueError, OSError) as e:
+        raise HTTPException(status_code=400, detail=f"Could not parse {ctype} body: {e}")
+    return conform(df, schema)
+
+
+def conform(df, schema):
+    """Select/order `schema`'s fields, fill defaults and cast to their types.
+
+    Values the single-record route would reject are a 422 here too: missing
+    values in required columns, non-numbers in numeric ones and fractions
+    in integer ones.
+    """
+    missing = [name for name, f in schema.model_fields.items() if f.is_required() and name not in df.columns]
+    if missing:
+        raise HTTPException(status_code=422, detail=f"Missing required columns: {missing}")
+    out = pd.DataFrame(index=df.index)
+    for name, f in schema.model_fields.items():
+        col = df[name] if name in df.columns else pd.Series(f.default, index=df.index)
+        if f.annotation in (int, float):
+            col = pd.to_numeric(col, errors="coerce")
+            if col.isna().any():
+                if f.is_required():
+                    raise HTTPException(status_code=422, detail=f"Column {name} has missing or non-numeric values")
+                col = col.fillna(f.default)
+            if f.annotation is int and not (np.isfinite(col) & (col == col.round())).all():
+                raise HTTPException(status_code=422, detail=f"Column {name} has non-integer values")
+            col = col.astype(f.annotation)
+        else:
+            if col.isna().any():
+                if f.is_required():
+                    raise HTTPException(status_code=422, detail=f"Column {name} has missing values")
+                col = col.fillna(f.default)
+            col = col.astype(str)
+        out[name] = col
+    return out.reset_index(drop=True)
+
+
+def ndjson(df, score, chunk_size=None):
+    """Stream `score(chunk) -> list[dict]` over `df` as NDJSON.
+
+    Each line also carries the input row number. Chunks bound the size of the
+    intermediate arrays the model allocates while scoring.
+    """
+    chunk_size = max(int(chunk_size or CHUNK_SIZE), 1)
+
+    def lines():
+        for start in range(0, len(df), chunk_size):
+            results = score(df.iloc[start:start + chunk_size])
+            yield "".join(json.dumps({"row": start + i, **r}) + "\n" for i, r in enumerate(results))
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
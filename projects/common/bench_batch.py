@@ -0,0 +1,92 @@
+"""Throughput of batch prediction endpoints vs one request per record.
+
+Starts the chosen API with uvicorn on a free local port (models must have
+been trained), then scores the same N records both ways.
+
+Usage:
+    python projects/common/bench_batch.py --app exoplanet -n 2000
+    python projects/common/bench_batch.py --app rookie --route predict_pro_bowl -n 2000
+"""
+import argparse
+import importlib
+import io
+import os
+import socket
+import sys
+import threading
+import time
+import pandas as pd
+import requests
+import uvicorn
+
+ROOT = os.path.join(os.path.dirname(__file__), "..", "..")
+sys.path.insert(0, os.path.abspath(ROOT))
+
+from projects.common.feature_store import read_table
+
+APPS = {
+    "exoplanet": ("projects.exoplanet-habitability.src.api", "ExoInput", "projects/exoplanet-habitability/data/processed/exoplanets_clean", "predict_habitability"),
+    "rookie": ("projects.football-rookie-analysis.src.api", "RookieInput", "projects/football-rookie-analysis/data/processed/rookie_features", "predict_pro_bowl"),
+}
+
+
+def serve(app):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}", server
+
+
+def sample_records(module, schema_name, stem, n):
+    schema = getattr(module, schema_name)
+    df = read_table(os.path.join(ROOT, stem))
+    cols = [c for c in schema.model_fields if c in df.columns]
+    df = df[cols].dropna()
+    df = pd.concat([df] * (n // len(df) + 1), ignore_index=True).head(n)
+    return [schema(**r).model_dump() for r in df.to_dict(orient="records")]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--app", choices=sorted(APPS), default="exoplanet")
+    parser.add_argument("--route", default=None)
+    parser.add_argument("-n", type=int, default=2000)
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    module_name, schema_name, stem, route = APPS[args.app]
+    route = args.route or route
+    module = importlib.import_module(module_name)
+    records = sample_records(module, schema_name, stem, args.n)
+    base, server = serve(module.app)
+    http = requests.Session()
+
+    t = time.perf_counter()
+    for r in records:
+        http.post(f"{base}/{route}", json=r).raise_for_status()
+    single = time.perf_counter() - t
+
+    t = time.perf_counter()
+    resp = http.post(f"{base}/{route}/batch", params={"chunk_size": args.chunk_size}, json=records)
+    resp.raise_for_status()
+    assert len(resp.text.splitlines()) == len(records)
+    batch_json = time.perf_counter() - t
+
+    buf = io.StringIO()
+    pd.DataFrame(records).to_csv(buf, index=False)
+    t = time.perf_counter()
+    resp = http.post(f"{base}/{route}/batch", params={"chunk_size": args.chunk_size},
+                     data=buf.getvalue().encode(), headers={"Content-Type": "text/csv"})
+    resp.raise_for_status()
+    batch_csv = time.perf_counter() - t
+
+    n = len(records)
+    print(f"{args.app} /{route}, {n} records")
+    print(f"  per-record : {single:8.3f}s  {n / single:10.0f} rec/s")
+    print(f"  batch JSON : {batch_json:8.3f}s  {n / batch_json:10.0f} rec/s  ({single / batch_json:.0f}x)")
+    print(f"  batch CSV  : {batch_csv:8.3f}s  {n / batch_csv:10.0f} rec/s  ({single / batch_csv:.0f}x)")
+    server.should_exit = True
@@ -0,0 +1,66 @@
+"""Single-record latency: sklearn pipeline on a one-row DataFrame vs the NumPy plan.
+
+Models and their `.plan` files must have been produced by train_models.
+Each sampled record is scored both ways (parity is re-checked on the way) and
+the per-call latency percentiles are printed.
+
+Usage:
+    python projects/common/bench_fastpath.py --app exoplanet -n 2000
+    python projects/common/bench_fastpath.py --app rookie
+"""
+import argparse
+import importlib
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(__file__), "..", "..")
+sys.path.insert(0, os.path.abspath(ROOT))
+
+from projects.common.bench_batch import APPS, sample_records
+from projects.common.fastpath import TOLERANCE
+
+MODELS = {"exoplanet": ["classifier"], "rookie": ["regression", "classification"]}
+
+
+def timed(fn, records):
+    out, lat = [], []
+    for r in records:
+        t = time.perf_counter()
+        out.append(fn(r))
+        lat.append(time.perf_counter() - t)
+    return np.array(out), np.array(lat) * 1e6
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--app", choices=sorted(APPS), default="exoplanet")
+    parser.add_argument("-n", type=int, default=2000)
+    args = parser.parse_args()
+
+    module_name, schema_name, stem, _ = APPS[args.app]
+    module = importlib.import_module(module_name)
+    records = sample_records(module, schema_name, stem, args.n)
+    columns = list(getattr(module, schema_name).model_fields)
+    module.registry.load_all()
+
+    for name in MODELS[args.app]:
+        model = module.registry.get(name).model
+        scorer = module.registry.get(f"{name}_plan").model
+        if hasattr(model, "predict_proba"):
+            slow = lambda r: model.predict_proba(pd.DataFrame([r], columns=columns))[0, 1]
+            fast = lambda r: scorer.predict_proba(scorer.encode([r]))[0, 1]
+        else:
+            slow = lambda r: model.predict(pd.DataFrame([r], columns=columns))[0]
+            fast = lambda r: scorer.predict(scorer.encode([r]))[0]
+        expected, t_slow = timed(slow, records)
+        got, t_fast = timed(fast, records)
+        diff = float(np.max(np.abs(expected - got)))
+        assert diff <= TOLERANCE, f"{name}: plan differs from sklearn by {diff:g}"
+        print(f"{args.app}/{name}, {len(records)} single-record calls (max diff {diff:.1e})")
+        for label, lat in (("sklearn", t_slow), ("fast path", t_fast)):
+            p50, p99 = np.percentile(lat, [50, 99])
+            print(f"  {label:9}: p50 {p50:8.1f}us  p99 {p99:8.1f}us")
+        print(f"  speedup  : {np.median(t_slow) / np.median(t_fast):.0f}x at p50")
@@ -0,0 +1,122 @@
+"""Memory per worker and cold-load time: joblib.load of a forest vs the memory-mapped plan.
+
+Trains a RandomForestClassifier on synthetic data (or takes an existing
+``--model`` .joblib), exports its plan and starts `--workers` fresh
+processes per format, as uvicorn workers would be. Each one loads the
+artifact, scores a batch and reads every array once, then waits until all
+its siblings did the same before reading its own /proc/self/smaps_rollup:
+
+- RSS counts every resident page the worker maps, shared or not
+- PSS splits shared pages between the processes mapping them
+- Private is what the worker alone holds, i.e. what each extra worker adds
+
+Linux only (smaps_rollup).
+
+Usage:
+    python projects/common/bench_mmap.py
+    python projects/common/bench_mmap.py --workers 8 --trees 100
+    python projects/common/bench_mmap.py --model projects/exoplanet-habitability/models/classifier.joblib
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(__file__), "..", "..")
+sys.path.insert(0, os.path.abspath(ROOT))
+
+FIELDS = ("Rss", "Pss", "Private_Clean", "Private_Dirty")
+
+
+def memory():
+    """{field: bytes} from /proc/self/smaps_rollup."""
+    out = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            name, _, rest = line.partition(":")
+            if name in FIELDS:
+                out[name] = int(rest.split()[0]) * 1024
+    out["Private"] = out.pop("Private_Clean") + out.pop("Private_Dirty")
+    return out
+
+
+def worker(kind, path, X, barrier, results):
+    import joblib
+    from projects.common.fastpath import load_plan
+    before = memory()
+    t = time.perf_counter()
+    if kind == "joblib":
+        model = joblib.load(path)
+        elapsed = time.perf_counter() - t
+        model.predict_proba(X)
+    else:
+        scorer, _ = load_plan(path)
+        elapsed = time.perf_counter() - t
+        scorer.predict_proba(X)
+        for values in scorer.plan.values():  # fault in every page, as a long-running worker would
+            if values.dtype.kind in "iuf":
+                values.sum()
+    barrier.wait()
+    after = memory()
+    results.put({"load": elapsed, **{k: after[k] - before[k] for k in after}})
+    barrier.wait()  # stay mapped until every sibling has measured
+
+
+def run(kind, path, X, workers):
+    ctx = multiprocessing.get_context("spawn")
+    barrier, results = ctx.Barrier(workers), ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(kind, path, X, barrier, results)) for _ in range(workers)]
+    for p in procs:
+        p.start()
+    rows = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+    return rows
+
+
+def synthetic_model(trees, rows, seed=0):
+    from sklearn.ensemble import RandomForestClassifier
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(rows, 12))
+    y = (X[:, 0] + X[:, 1] * X[:, 2] + rng.normal(scale=1.0, size=rows) > 0).astype(int)
+    return RandomForestClassifier(n_estimators=trees, random_state=seed, n_jobs=-1).fit(X, y), X
+
+
+if __name__ == "__main__":
+    import joblib
+    import pandas as pd
+    from projects.common.fastpath import compile_plan, save_plan
+    from projects.common.model_registry import save_model
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", help="existing .joblib (default: a synthetic forest)")
+    parser.add_argument("--trees", type=int, default=50)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.model:
+            model = joblib.load(args.model)
+            columns = list(getattr(model, "feature_names_in_", []))
+            X = pd.DataFrame(np.ones((256, len(columns))), columns=columns)
+        else:
+            model, X = synthetic_model(args.trees, args.rows)
+            X = X[:256]
+        model_path = save_model(model, os.path.join(tmp, "model.joblib"))
+        plan_file = save_plan(compile_plan(model), os.path.join(tmp, "model.plan"))
+        del model
+
+        mib = lambda b: f"{b / 2**20:8.1f} MiB"
+        print(f"artifact: joblib {mib(os.path.getsize(model_path))}, plan {mib(os.path.getsize(plan_file))}; "
+              f"{args.workers} workers")
+        print(f"{'format':>7} {'load p50':>10} {'RSS/worker':>12} {'PSS/worker':>12} {'private/worker':>15} {'host total':>12}")
+        for kind, path in (("joblib", model_path), ("mmap", plan_file)):
+            rows = run(kind, path, X, args.workers)
+            load = float(np.median([r["load"] for r in rows]))
+            mean = lambda k: float(np.mean([r[k] for r in rows]))
+            print(f"{kind:>7} {load * 1e3:>8.1f}ms {mib(mean('Rss')):>12} {mib(mean('Pss')):>12} "
+                  f"{mib(mean('Private')):>15} {mib(sum(r['Pss'] for r in rows)):>12}")
@@ -0,0 +1,72 @@
+"""Serialization time vs row count for a covid_features-shaped frame.
+
+Compares the old response path (``to_dict(orient="records")`` +
+`jsonable_encoder` + json) with `frame_json`'s records, columnar and Arrow
+encoders, and checks the records output parses to the same rows.
+
+Usage:
+    python projects/common/bench_serialize.py
+    python projects/common/bench_serialize.py --rows 1000 100000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(__file__), "..", "..")
+sys.path.insert(0, os.path.abspath(ROOT))
+
+from fastapi.encoders import jsonable_encoder
+from projects.common.frame_json import arrow_ipc, columnar_json, frame_columns, records_json
+
+
+def synthetic(n, seed=0):
+    rng = np.random.default_rng(seed)
+    cases = rng.random(n) * 1e6
+    cases[rng.random(n) < 0.1] = np.nan
+    return pd.DataFrame({
+        "iso_code": rng.choice(["CHL", "USA", "IND", "FRA"], n),
+        "location": rng.choice(["Chile", "United States", "India", "France"], n),
+        "date": pd.date_range("2020-01-01", periods=n, freq="h"),
+        "total_cases": cases,
+        "new_cases": rng.integers(0, 5000, n),
+        "people_vaccinated": rng.random(n) * 1e7,
+        "cases_per_million": rng.random(n) * 1e5,
+        "new_cases_7day_avg": rng.random(n) * 1e3,
+    })
+
+
+def legacy(df):
+    """What a route returning df.to_dict(orient="records") cost."""
+    records = df.astype(object).where(df.notna(), None).to_dict(orient="records")
+    return json.dumps(jsonable_encoder(records), separators=(",", ":")).encode()
+
+
+def best_of(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - t)
+    return min(times), out
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[100, 1_000, 10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'to_dict+encoder':>16} {'records':>10} {'columnar':>10} {'arrow':>10} {'speedup':>8}")
+    for n in args.rows:
+        df = synthetic(n)
+        t_old, old = best_of(lambda: legacy(df), max(1, args.repeat // 2))
+        t_rec, rec = best_of(lambda: records_json(frame_columns(df)), args.repeat)
+        t_col, _ = best_of(lambda: columnar_json(frame_columns(df)), args.repeat)
+        t_arrow, _ = best_of(lambda: arrow_ipc(frame_columns(df)), args.repeat)
+        assert json.loads(rec) == json.loads(old)
+        times = " ".join(f"{t * 1e3:>8.2f}ms" for t in (t_rec, t_col, t_arrow))
+        print(f"{n:>8} {t_old * 1e3:>14.2f}ms {times} {t_old / t_rec:>7.1f}x")
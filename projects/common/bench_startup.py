@@ -0,0 +1,95 @@
+"""Time to first response of each API from a cold `uvicorn` process, per warm-up mode.
+
+For every app and `API_WARMUP` mode, starts uvicorn in a fresh process and
+polls from the moment it is spawned. Reports when `/health` first answers,
+when the first real request succeeds, and when the warm-up reports ready
+(its phase timings come from `/health`). Models and processed tables must
+exist (run the pipeline first).
+
+Usage:
+    python projects/common/bench_startup.py
+    python projects/common/bench_startup.py --apps covid --modes eager background --repeat 5
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+import numpy as np
+import requests
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+EXO = {"pl_orbsmax": 1.0, "pl_rade": 1.1, "pl_insol": 0.9, "st_teff": 5600, "st_rad": 1.0}
+APPS = {
+    "exoplanet": ("projects.exoplanet-habitability.src.api:app", "post", "/predict_habitability", EXO),
+    "rookie": ("projects.football-rookie-analysis.src.api:app", "get", "/rookies?limit=20", None),
+    "covid": ("projects.covid19-dashboard.src.api:app", "get", "/metrics?limit=30", None),
+}
+MODES = ("eager", "background", "lazy")
+POLL = 0.005
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def until(fn, timeout):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            result = fn()
+            if result is not None:
+                return result
+        except requests.ConnectionError:
+            pass
+        time.sleep(POLL)
+    raise TimeoutError("the app did not answer in time")
+
+
+def ready(url):
+    """/health's startup info once the warm-up finished, else None."""
+    info = requests.get(url + "/health", timeout=5).json()["startup"]
+    return info if info["ready"] else None
+
+
+def cold_start(app, mode, timeout=60):
+    """(health s, first response s, ready s, /health startup info) for one fresh process."""
+    module, method, path, body = APPS[app]
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    env = {**os.environ, "API_WARMUP": mode, "PYTHONPATH": ROOT}
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", module, "--port", str(port), "--log-level", "warning"],
+                            cwd=ROOT, env=env)
+    try:
+        until(lambda: requests.get(url + "/health", timeout=5).ok or None, timeout)
+        t_health = time.perf_counter() - t0
+        response = until(lambda: getattr(requests, method)(url + path, json=body, timeout=30), timeout)
+        response.raise_for_status()
+        t_first = time.perf_counter() - t0
+        info = until(lambda: ready(url), timeout)
+        # lazy mode has nothing to warm: it is ready once the first request loaded what it needs
+        return t_health, t_first, t_first if mode == "lazy" else time.perf_counter() - t0, info
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--apps", nargs="+", choices=sorted(APPS), default=list(APPS))
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'app':>10} {'mode':>11} {'/health':>9} {'first req':>10} {'ready':>8}  phases (last run, s)")
+    for app in args.apps:
+        for mode in args.modes:
+            runs = [cold_start(app, mode) for _ in range(args.repeat)]
+            med = [float(np.median([r[i] for r in runs])) for i in range(3)]
+            phases = " ".join(f"{k}={v:.3f}" for k, v in runs[-1][3]["phases"].items())
+            print(f"{app:>10} {mode:>11} " + " ".join(f"{t:>8.2f}s" for t in med) + f"  {phases}")
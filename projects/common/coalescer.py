@@ -0,0 +1,79 @@
+"""Micro-batching for single-record prediction routes.
+
+Requests hand their record to `Coalescer.submit()` and await the result. The
+first record of a batch arms a `max_wait` timer; the batch is dispatched when
+the timer fires or `max_batch` records are waiting, whichever comes first.
+The whole batch is scored in one call on a worker thread, so the event
+loop keeps accepting requests while sklearn runs, and each caller gets its
+own row of the result back.
+"""
+import asyncio
+import os
+import time
+
+from projects.common.stats import SPANS, Histogram, span
+
+MAX_BATCH = int(os.environ.get("COALESCE_MAX_BATCH", "64"))
+WINDOW_MS = float(os.environ.get("COALESCE_WINDOW_MS", "2"))
+
+BATCH_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+WAIT_BUCKETS = [0.0005, 0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1]
+
+
+class Coalescer:
+    def __init__(self, score, max_batch=MAX_BATCH, max_wait=WINDOW_MS / 1000):
+        """`score(records) -> list` must return one result per input record."""
+        self.score = score
+        self.max_batch = max(int(max_batch), 1)
+        self.max_wait = max(float(max_wait), 0.0)
+        self.batch_size = Histogram(BATCH_BUCKETS)
+        self.queue_wait = Histogram(WAIT_BUCKETS)
+        self._pending = []
+        self._timer = None
+        self._tasks = set()
+
+    async def submit(self, record):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((record, future, time.perf_counter()))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        with span("predict"):
+            return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        now = time.perf_counter()
+        self.batch_size.observe(len(batch))
+        for _, _, queued in batch:
+            self.queue_wait.observe(now - queued)
+        task = asyncio.get_running_loop().create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        # the task inherited the context of the request that flushed it; the
+        # batch's own spans belong to no single request
+        SPANS.set(None)
+        records = [record for record, _, _ in batch]
+        try:
+            results = await asyncio.to_thread(self.score, records)
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self):
+        return {"batch_size": self.batch_size.snapshot(), "queue_wait_seconds": self.queue_wait.snapshot(),
+                "max_batch": self.max_batch, "max_wait_seconds": self.max_wait}
@@ -0,0 +1,88 @@
+"""Server-side downsampling of grouped daily series (the COVID /metrics API).
+
+`buckets()` groups each series' rows by calendar week (Monday start) or
+month. Columns named in `summed` (daily counts) are added up over the
+bucket. Every other column takes its value on the bucket's last day:
+running totals, rolling averages and percentages are already smoothed, so
+their end-of-period value is the one a chart wants. The row's date is that
+last day.
+
+`lttb()` keeps the points a line chart needs with
+Largest-Triangle-Three-Buckets (Steinarsson, 2013). It keeps the first
+and last point and, from each bucket in between, the point forming the
+largest triangle with the previously kept point and the next bucket's
+average. Picked rows are returned unchanged.
+"""
+import numpy as np
+
+from projects.common.startup import lazy_import
+
+pd = lazy_import("pandas")
+
+MODES = ("week", "month", "lttb")
+
+
+def bucket_keys(days, mode):
+    """Bucket number of each int32 epoch day for `mode` ("week" or "month")."""
+    if mode == "week":
+        return (days.astype(np.int64) + 3) // 7  # 1970-01-01 was a Thursday
+    if mode == "month":
+        return days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+    raise ValueError(f"Unknown bucket mode {mode!r}")
+
+
+def buckets(columns, group, days, mode, summed=()):
+    """Aggregate row-aligned `columns` per (group, bucket); rows must be sorted by group then day."""
+    n = len(days)
+    if not n:
+        return columns
+    keys = bucket_keys(days, mode)
+    change = np.r_[True, (keys[1:] != keys[:-1]) | (group[1:] != group[:-1])]
+    starts = np.flatnonzero(change)
+    last = np.r_[starts[1:], n] - 1
+
+    out = {}
+    for name, values in columns.items():
+        if name in summed:
+            out[name] = _sum(values, starts)
+        else:
+            out[name] = values[last]
+    return out
+
+
+def _sum(values, starts):
+    """Per-bucket sum ignoring missing values; missing where a bucket has none."""
+    if isinstance(values, np.ndarray):
+        numeric = values.astype(np.float64)
+    else:
+        numeric = values.to_numpy(dtype=np.float64, na_value=np.nan)  # nullable ints
+    present = ~np.isnan(numeric)
+    total = np.add.reduceat(np.where(present, numeric, 0.0), starts)
+    seen = np.add.reduceat(present.astype(np.int64), starts)
+    total[seen == 0] = np.nan
+    if values.dtype.kind in "iu":
+        return pd.array(total, dtype="Int64")
+    return total
+
+
+def lttb(x, y, points):
+    """Indices of `points` rows of the series (x, y) chosen by LTTB; all rows if it is shorter."""
+    n = len(x)
+    if points >= n or points < 3:
+        return np.arange(n) if points >= n else np.array([0, n - 1])[:max(points, 1)]
+    x = np.asarray(x, dtype=np.float64)
+    y = np.nan_to_num(np.asarray(y, dtype=np.float64))
+    every = (n - 2) / (points - 2)
+    edges = (np.arange(points - 1) * every).astype(np.int64) + 1
+    edges[-1] = n - 1
+    picked = np.empty(points, dtype=np.int64)
+    picked[0], picked[-1] = 0, n - 1
+    a = 0
+    for i in range(points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nlo, nhi = hi, (edges[i + 2] if i + 2 < len(edges) else n)
+        avg_x, avg_y = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        picked[i + 1] = a
+    return picked
@@ -0,0 +1,382 @@
+"""NumPy-only inference plans compiled from the trained sklearn pipelines.
+
+For a single row, building a DataFrame and walking a ColumnTransformer costs
+far more than the arithmetic of the model itself. `compile_plan()` flattens a
+fitted pipeline into plain arrays:
+
+* the one-hot category -> column maps and the StandardScaler mean/scale,
+* linear/logistic coefficients, or
+* every tree of a random forest concatenated into one set of node arrays,
+
+and `FastScorer` turns input records straight into a feature matrix and
+predictions with a handful of vectorized NumPy operations. Supported
+pipelines are the ones the train_models scripts produce: an optional
+ColumnTransformer(OneHotEncoder, StandardScaler) or StandardScaler step
+followed by LinearRegression, LogisticRegression or a RandomForest.
+
+Plans are saved in a flat file that `load_plan` memory-maps read-only (see
+`save_plan`). Loading is a header parse, and every uvicorn worker on a host
+maps the same page-cache pages instead of holding its own copy of the
+forest. The header records the sha256 of the .joblib the plan was compiled
+from, and `load_plan` ignores a plan whose .joblib has since changed.
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import numpy as np
+
+from projects.common.model_registry import file_sha256
+from projects.common.stats import span
+
+TOLERANCE = 1e-9
+MAGIC = b"NPPLAN01"
+ALIGN = 64
+
+
+def plan_path(model_path):
+    """`models/classifier.joblib` -> `models/classifier.plan`."""
+    return os.path.splitext(model_path)[0] + ".plan"
+
+
+def discard_plan(model_path):
+    """Remove the plan exported for `model_path`, before a new model replaces it.
+
+    Otherwise a failed export would leave the previous model's plan, which
+    the APIs prefer, next to the new artifact.
+    """
+    try:
+        os.remove(plan_path(model_path))
+    except FileNotFoundError:
+        pass
+
+
+def compile_plan(model):
+    """Flatten a fitted pipeline into a dict of arrays plus a JSON `meta` entry."""
+    # sklearn is only needed when training; the APIs score plans without it
+    from sklearn.compose import ColumnTransformer
+    from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+    from sklearn.linear_model import LinearRegression, LogisticRegression
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import StandardScaler
+    steps = model.steps if isinstance(model, Pipeline) else [("model", model)]
+    *transforms, (_, estimator) = steps
+    if len(transforms) > 1:
+        raise ValueError("Only one preprocessing step is supported")
+
+    plan = {}
+    meta = {"columns": [str(c) for c in getattr(model, "feature_names_in_", [])], "cat_columns": [], "scaled": False}
+    if transforms:
+        _, pre = transforms[0]
+        if isinstance(pre, ColumnTransformer):
+            num_columns = _compile_column_transformer(pre, plan, meta)
+        elif isinstance(pre, StandardScaler):
+            num_columns = meta["columns"]
+            _compile_scaler(pre, plan, meta)
+        else:
+            raise ValueError(f"Unsupported preprocessing step {type(pre).__name__}")
+    else:
+        num_columns = meta["columns"]
+    meta["num_columns"] = list(num_columns)
+
+    if isinstance(estimator, (LinearRegression, LogisticRegression)):
+        meta["estimator"] = "logistic" if isinstance(estimator, LogisticRegression) else "linear"
+        plan["coef"] = np.atleast_2d(estimator.coef_).astype(np.float64)
+        plan["intercept"] = np.atleast_1d(estimator.intercept_).astype(np.float64)
+        if meta["estimator"] == "logistic" and len(estimator.classes_) != 2:
+            raise ValueError("Only binary LogisticRegression is supported")
+    elif isinstance(estimator, (RandomForestClassifier, RandomForestRegressor)):
+        meta["estimator"] = "forest_classifier" if isinstance(estimator, RandomForestClassifier) else "forest_regressor"
+        _compile_forest(estimator, plan, meta)
+    else:
+        raise ValueError(f"Unsupported estimator {type(estimator).__name__}")
+
+    plan["meta"] = np.array(json.dumps(meta))
+    return plan
+
+
+def _compile_column_transformer(pre, plan, meta):
+    from sklearn.preprocessing import OneHotEncoder, StandardScaler
+    num_columns = []
+    for name, transformer, columns in pre.transformers_:
+        if transformer == "drop" or not len(columns):
+            continue
+        if isinstance(transformer, OneHotEncoder):
+            if num_columns:
+                raise ValueError("The one-hot block must come before the scaled block")
+            if transformer.drop is not None:
+                raise ValueError("OneHotEncoder(drop=...) is not supported")
+            for column, categories in zip(columns, transformer.categories_):
+                plan[f"categories_{len(meta['cat_columns'])}"] = np.array([str(c) for c in categories])
+                meta["cat_columns"].append(column)
+        elif isinstance(transformer, StandardScaler):
+            if num_columns:
+                raise ValueError("Only one StandardScaler block is supported")
+            num_columns = list(columns)
+            _compile_scaler(transformer, plan, meta)
+        else:
+            raise ValueError(f"Unsupported transformer {type(transformer).__name__}")
+    if pre.remainder != "drop":
+        raise ValueError("ColumnTransformer(remainder=...) is not supported")
+    return num_columns
+
+
+def _compile_scaler(scaler, plan, meta):
+    n = scaler.n_features_in_
+    plan["mean"] = scaler.mean_ if scaler.with_mean else np.zeros(n)
+    plan["scale"] = scaler.scale_ if scaler.with_std else np.ones(n)
+    meta["scaled"] = True
+
+
+def _compile_forest(forest, plan, meta):
+    """Concatenate all trees; leaves point to themselves so traversal can run a fixed number of steps."""
+    feature, threshold, left, right, value, roots = [], [], [], [], [], []
+    offset, depth = 0, 0
+    for tree in (est.tree_ for est in forest.estimators_):
+        n = tree.node_count
+        is_leaf = tree.children_left == -1
+        own = np.arange(offset, offset + n)
+        roots.append(offset)
+        feature.append(np.where(is_leaf, 0, tree.feature))
+        threshold.append(np.where(is_leaf, np.inf, tree.threshold))
+        left.append(np.where(is_leaf, own, tree.children_left + offset))
+        right.append(np.where(is_leaf, own, tree.children_right + offset))
+        v = tree.value[:, 0, :] if meta["estimator"] == "forest_classifier" else tree.value[:, :, 0]
+        if meta["estimator"] == "forest_classifier":
+            v = v / v.sum(axis=1, keepdims=True)
+        value.append(v)
+        offset += n
+        depth = max(depth, tree.max_depth)
+    plan["tree_feature"] = np.concatenate(feature).astype(np.int64)
+    plan["tree_threshold"] = np.concatenate(threshold).astype(np.float64)
+    plan["tree_left"] = np.concatenate(left).astype(np.int64)
+    plan["tree_right"] = np.concatenate(right).astype(np.int64)
+    plan["tree_value"] = np.concatenate(value).astype(np.float64)
+    plan["tree_roots"] = np.array(roots, dtype=np.int64)
+    meta["max_depth"] = int(depth)
+
+
+class FastScorer:
+    def __init__(self, plan):
+        self.plan = plan
+        self.meta = json.loads(str(plan["meta"]))
+        self.estimator = self.meta["estimator"]
+        self.cat_columns = self.meta["cat_columns"]
+        self.num_columns = self.meta["num_columns"]
+        # category -> column index in the encoded vector, per categorical column
+        self.cat_index, self.cat_offsets, width = [], [], 0
+        for i in range(len(self.cat_columns)):
+            categories = plan[f"categories_{i}"]
+            self.cat_index.append({c: width + j for j, c in enumerate(categories.tolist())})
+            self.cat_offsets.append(width)
+            width += len(categories)
+        self.cat_width = width
+        if self.meta["scaled"]:
+            self.mean, self.scale = plan["mean"], plan["scale"]
+
+    def encode(self, records):
+        """Feature matrix for a list of input dicts (e.g. ``model_dump()`` output)."""
+        n = len(records)
+        X = np.zeros((n, self.cat_width + len(self.num_columns)))
+        for column, index in zip(self.cat_columns, self.cat_index):
+            for i, r in enumerate(records):
+                k = index.get(str(r[column]))
+                if k is not None:  # unknown categories encode as all zeros
+                    X[i, k] = 1.0
+        num = np.array([[r[c] for c in self.num_columns] for r in records], dtype=np.float64).reshape(n, -1)
+        if self.meta["scaled"]:
+            num = (num - self.mean) / self.scale
+        X[:, self.cat_width:] = num
+        return X
+
+    def encode_frame(self, df):
+        """`encode` for a DataFrame with the input columns, without going through records."""
+        import pandas as pd
+        X = np.zeros((len(df), self.cat_width + len(self.num_columns)))
+        rows = np.arange(len(df))
+        for i, (column, offset) in enumerate(zip(self.cat_columns, self.cat_offsets)):
+            codes = pd.Index(self.plan[f"categories_{i}"]).get_indexer(df[column].astype(str))
+            known = codes >= 0  # unknown categories encode as all zeros
+            X[rows[known], offset + codes[known]] = 1.0
+        num = df[self.num_columns].to_numpy(dtype=np.float64)
+        if self.meta["scaled"]:
+            num = (num - self.mean) / self.scale
+        X[:, self.cat_width:] = num
+        return X
+
+    def decision(self, X):
+        if self.estimator in ("linear", "logistic"):
+            return X @ self.plan["coef"].T + self.plan["intercept"]
+        return self._forest(X)
+
+    def predict(self, X):
+        if self.estimator == "linear":
+            return self.decision(X)[:, 0]
+        if self.estimator == "forest_regressor":
+            return self._forest(X)[:, 0]
+        return self.predict_proba(X).argmax(axis=1)
+
+    def predict_proba(self, X):
+        if self.estimator == "logistic":
+            p = 1.0 / (1.0 + np.exp(-self.decision(X)[:, 0]))
+            return np.column_stack([1 - p, p])
+        if self.estimator == "forest_classifier":
+            return self._forest(X)
+        raise ValueError(f"{self.estimator} has no predict_proba")
+
+    def _forest(self, X):
+        p = self.plan
+        # sklearn trees compare float32 inputs against float64 thresholds
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        rows = np.arange(len(X))[:, None]
+        node = np.broadcast_to(p["tree_roots"], (len(X), len(p["tree_roots"]))).copy()
+        feature, threshold, left, right = p["tree_feature"], p["tree_threshold"], p["tree_left"], p["tree_right"]
+        for _ in range(self.meta["max_depth"]):
+            go_left = X[rows, feature[node]] <= threshold[node]
+            node = np.where(go_left, left[node], right[node])
+        return p["tree_value"][node].mean(axis=1)
+
+
+def check_parity(model, scorer, X, tolerance=TOLERANCE):
+    """Max abs difference between sklearn and the plan on DataFrame `X`; raises above `tolerance`."""
+    records = X.to_dict(orient="records")
+    fast = scorer.encode(records)
+    if scorer.estimator in ("logistic", "forest_classifier"):
+        expected, got = model.predict_proba(X), scorer.predict_proba(fast)
+    else:
+        expected, got = model.predict(X), scorer.predict(fast)
+    diff = float(np.max(np.abs(expected - got))) if len(X) else 0.0
+    if not np.allclose(got, expected, rtol=tolerance, atol=tolerance):
+        raise AssertionError(f"Fast-path plan differs from sklearn by up to {diff:g}")
+    return diff
+
+
+def export_plan(model, X, model_path):
+    """Compile, parity-check against `X` and save the plan next to `model_path`."""
+    plan = compile_plan(model)
+    diff = check_parity(model, FastScorer(plan), X)
+    path = save_plan(plan, plan_path(model_path), source_sha256=file_sha256(model_path))
+    print(f"Saved fast-path plan to {os.path.basename(path)} (max diff vs sklearn {diff:.1e})")
+    return path
+
+
+def save_plan(plan, path, source_sha256=None):
+    """Write a plan for `load_plan` to map: a JSON header, then each array's raw bytes.
+
+    Layout: MAGIC, the header length as little-endian uint64, the header
+    ``{"sha256": ..., "source_sha256": ..., "arrays": {name: [dtype, shape, offset]}}``, then the
+    arrays in C order at `ALIGN`-byte offsets, so every mapped array is
+    aligned. The sha256 covers the array entries and bytes, so a loader gets
+    the plan's version without reading the whole file. Written to a temp file
+    and renamed, so readers never see a partial plan.
+    """
+    arrays = {name: np.asarray(value, order="C") for name, value in plan.items()}
+    if any(a.dtype.hasobject for a in arrays.values()):
+        raise ValueError("Plan arrays must not hold Python objects")
+    entries, offset = {}, 0
+    for name, a in arrays.items():
+        entries[name] = [a.dtype.str, list(a.shape), offset]
+        offset += -(-a.nbytes // ALIGN) * ALIGN
+    digest = hashlib.sha256(json.dumps(entries).encode())
+    for a in arrays.values():
+        digest.update(a.tobytes())
+    header = json.dumps({"sha256": digest.hexdigest(), "source_sha256": source_sha256, "arrays": entries}).encode()
+    start = _data_start(len(header))
+
+    tmp = f"{path}.tmp-{os.getpid()}"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + struct.pack("<Q", len(header)) + header)
+        for name, a in arrays.items():
+            f.seek(start + entries[name][2])
+            f.write(a.tobytes())
+        f.truncate(start + offset)
+    os.replace(tmp, path)
+    return path
+
+
+def map_plan(path):
+    """({name: read-only array}, header) backed by a shared memory map of a `save_plan` file."""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a fast-path plan; re-run train_models")
+        (size,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(size))
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    start = _data_start(size)
+    plan = {}
+    for name, (dtype, shape, offset) in header["arrays"].items():
+        count = int(np.prod(shape, dtype=np.int64))
+        # frombuffer keeps the map open for as long as an array uses it
+        plan[name] = np.frombuffer(mapped, dtype=np.dtype(dtype), count=count,
+                                   offset=start + offset).reshape(tuple(shape))
+    return plan, header
+
+
+def _data_start(header_size):
+    return -(-(len(MAGIC) + 8 + header_size) // ALIGN) * ALIGN
+
+
+def predict_records(registry, name, records, columns, proba=False):
+    """Predict input dicts with `name`'s plan if one was exported, else its sklearn pipeline.
+
+    The plan is registered as ``name + "_plan"`` with the pipeline's file as
+    its source, so a plan left over from an older pipeline is not used.
+    `columns` orders the DataFrame built for the sklearn fallback.
+    """
+    scorer = _scorer(registry, name)
+    if scorer is None:
+        import pandas as pd
+        model = registry.get(name).model
+        with span("features"):
+            df = pd.DataFrame(records, columns=list(columns))
+        with span("predict"):
+            return model.predict_proba(df) if proba else model.predict(df)
+    with span("features"):
+        X = scorer.encode(records)
+    with span("predict"):
+        return scorer.predict_proba(X) if proba else scorer.predict(X)
+
+
+def frame_predictor(registry, name, proba=False):
+    """`predict_records` for DataFrames, e.g. the chunks of a batch upload.
+
+    Returns a function bound to `name`'s current plan (or its sklearn
+    pipeline if no plan was exported), so every chunk of one request is
+    scored by the same model even if a new one is swapped in meanwhile.
+    """
+    scorer = _scorer(registry, name)
+    if scorer is not None:
+        encode, model = scorer.encode_frame, scorer
+    else:
+        encode, model = (lambda df: df), registry.get(name).model
+    predict = model.predict_proba if proba else model.predict
+
+    def score(df):
+        with span("features"):
+            X = encode(df)
+        with span("predict"):
+            return predict(X)
+    return score
+
+
+def _scorer(registry, name):
+    """`name`'s plan, or None if none was exported for its current artifact."""
+    try:
+        return registry.get(name + "_plan").model
+    except FileNotFoundError:
+        return None
+
+
+def load_plan(path, source=None):
+    """Registry loader: (FastScorer over the memory-mapped plan, sha256).
+
+    With `source` (the .joblib the plan is registered against), a plan
+    compiled from a different file loads as None, so callers fall back to
+    the .joblib instead of scoring with an older model.
+    """
+    plan, header = map_plan(path)
+    if source is not None and os.path.exists(source) and header.get("source_sha256") != file_sha256(source):
+        print(f"Ignoring {os.path.basename(path)}: it was not exported from the current {os.path.basename(source)}")
+        return None, header["sha256"]
+    return FastScorer(plan), header["sha256"]
@@ -0,0 +1,287 @@
+"""Parquet feature store shared by the three project pipelines.
+
+A table is addressed by its path stem, e.g. ``data/processed/covid_features``.
+The primary copy lives at ``<stem>.parquet`` (a single file, or a hive-style
+directory when partitioned) and an optional CSV export at ``<stem>.csv`` for
+Tableau. Readers fall back to the CSV when no Parquet copy exists yet, so the
+CSVs checked into the repo keep working.
+
+A partitioned table is a symlink to one of its versions in
+``<stem>.parquet.versions/``. A rewrite builds a new version and repoints
+the link with one `os.replace`, so the path always resolves to a complete
+table. The previous version is kept until the next rewrite, for readers
+that resolved the link just before the swap.
+"""
+import os
+import shutil
+import uuid
+
+from projects.common.startup import lazy_import
+from projects.common.stats import span
+
+pd = lazy_import("pandas")
+pa = lazy_import("pyarrow")
+ds = lazy_import("pyarrow.dataset")
+pq = lazy_import("pyarrow.parquet")
+
+SCHEMA_FILE = "_common_metadata"
+# a partition holding more files than this after an append is compacted
+COMPACT_FILES = int(os.environ.get("FEATURE_STORE_COMPACT_FILES", "16"))
+
+
+def parquet_path(stem):
+    return stem + ".parquet"
+
+
+def csv_path(stem):
+    return stem + ".csv"
+
+
+def write_table(df, stem, partition_cols=None, csv=True, dates=()):
+    """Write `df` as typed Parquet, partitioned by `partition_cols` if given.
+
+    Columns in `dates` are stored as date32 (whole days) instead of
+    nanosecond timestamps. The new copy is written next to the old one and
+    swapped in afterwards, so readers never see a half-written table.
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for col in dates:
+        i = table.schema.get_field_index(col)
+        table = table.set_column(i, col, table.column(i).cast(pa.date32()))
+    target = parquet_path(stem)
+    tmp = f"{target}.tmp-{os.getpid()}"
+    _remove(tmp)
+    if partition_cols:
+        pq.write_to_dataset(table, tmp, partition_cols=list(partition_cols))
+        # partition columns are dropped from the data files; keep their types here
+        pq.write_metadata(table.schema, os.path.join(tmp, SCHEMA_FILE))
+    else:
+        pq.write_table(table, tmp)
+    _swap(tmp, target)
+
+    if csv:
+        write_csv(df, csv_path(stem))
+    return target
+
+
+def append_table(df, stem, partition_cols=None, csv=True, dates=()):
+    """Append rows to an existing table without rewriting it.
+
+    On a partitioned table the rows land in new files inside their partition
+    directories, so the cost is proportional to `df`, not to the table. Once
+    a partition holds more than `COMPACT_FILES` files the table is compacted
+    (see `compact_table`), which keeps reads from slowing down as appends
+    pile up. The rows are cast to the stored schema first. Falls back to
+    `write_table` when the table does not exist yet. `dates` is passed on to
+    `write_table`.
+    """
+    target = parquet_path(stem)
+    if not os.path.exists(target):
+        return write_table(df, stem, partition_cols=partition_cols, csv=csv, dates=dates)
+    if not len(df):
+        return target
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    schema = _dataset(target).schema
+    table = table.select(schema.names).cast(schema)
+    if os.path.isdir(target):
+        pq.write_to_dataset(table, target, partition_cols=list(partition_cols or []),
+                            basename_template=f"append-{uuid.uuid4().hex}-{{i}}.parquet")
+        # new files only touch the partition directories; bump the root so
+        # table_version() notices the change
+        os.utime(target)
+        if _max_files(target) > COMPACT_FILES:
+            compact_table(stem, partition_cols, dates=dates)
+    else:
+        write_table(pd.concat([read_table(stem), df[schema.names]], ignore_index=True), stem, csv=False, dates=dates)
+
+    if csv and os.path.exists(csv_path(stem)):
+        _append_csv(df[schema.names], csv_path(stem))
+    return target
+
+
+def compact_table(stem, partition_cols, dates=()):
+    """Rewrite a partitioned table with one file per partition; the CSV is left alone."""
+    return write_table(read_table(stem), stem, partition_cols=partition_cols, csv=False, dates=dates)
+
+
+def write_csv(df, path):
+    """Atomically (re)write a CSV file."""
+    tmp = f"{path}.tmp-{os.getpid()}"
+    df.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+    return path
+
+
+def _append_csv(df, path):
+    """Append rows to the CSV in place, so the cost follows the new rows, not the file.
+
+    The rows are written and fsynced, and on any failure the file is cut
+    back to its old size, so it never keeps a partial append. Unlike
+    `write_csv` this writes into the file: it must not be a `link_file` name.
+    """
+    with open(path, "ab") as f:
+        size = f.tell()
+        try:
+            df.to_csv(f, header=False, index=False)
+            f.flush()
+            os.fsync(f.fileno())
+        except BaseException:
+            f.truncate(size)
+            raise
+    return path
+
+
+def link_file(src, dest):
+    """Atomically make `dest` another name for `src`: a hard link, or a copy where links fail.
+
+    Both names share one inode, so writers must replace either file (as
+    `write_csv` does) instead of writing into it.
+    """
+    tmp = f"{dest}.tmp-{os.getpid()}"
+    _remove(tmp)
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dest)
+    return dest
+
+
+def read_table(stem, columns=None, filters=None, parse_dates=None):
+    """Read a table with column projection and predicate pushdown.
+
+    `filters` uses the pyarrow DNF form, e.g. ``[("location", "=", "Chile")]``.
+    On a partitioned table, filters on partition columns skip whole
+    directories; other filters are pushed down to the row-group statistics.
+    `parse_dates` only matters for the CSV fallback.
+    """
+    with span("data_load"):
+        return _read_table(stem, columns, filters, parse_dates)
+
+
+def _read_table(stem, columns, filters, parse_dates):
+    # resolve a partitioned table's link once, so a swap mid-read can't mix versions
+    path = os.path.realpath(parquet_path(stem))
+    if os.path.exists(path):
+        dataset = _dataset(path)
+        expr = pq.filters_to_expression(filters) if filters else None
+        table = dataset.to_table(columns=columns, filter=expr)
+        # categoricals are read as plain strings (see _dataset); encode them again
+        for field in _schema(path) or []:
+            if pa.types.is_dictionary(field.type) and field.name in table.column_names:
+                i = table.schema.get_field_index(field.name)
+                table = table.set_column(i, field.name, table.column(i).dictionary_encode())
+        # date32 columns come back as datetime64, not datetime.date objects
+        return table.to_pandas(date_as_object=False)
+
+    path = csv_path(stem)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No Parquet or CSV copy of {stem}")
+    usecols = None
+    if columns is not None:
+        usecols = list(dict.fromkeys(list(columns) + [f[0] for f in _flatten(filters)]))
+    df = pd.read_csv(path, usecols=usecols, parse_dates=parse_dates)
+    if filters:
+        df = df[_mask(df, filters)]
+    if columns is not None:
+        df = df[list(columns)]
+    return df.reset_index(drop=True)
+
+
+def table_version(stem):
+    """Token that changes whenever the table is rewritten, or None if absent."""
+    for path in (parquet_path(stem), csv_path(stem)):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        return (path, st.st_ino, st.st_mtime_ns)
+    return None
+
+
+def _schema(path):
+    """Stored schema of a partitioned table, or None."""
+    if os.path.isdir(path) and os.path.exists(os.path.join(path, SCHEMA_FILE)):
+        return pq.read_schema(os.path.join(path, SCHEMA_FILE))
+    return None
+
+
+def _dataset(path):
+    schema = _schema(path)
+    if schema is not None:
+        # hive partition values can't be read into dictionary fields; read strings
+        schema = pa.schema([f.with_type(f.type.value_type) if pa.types.is_dictionary(f.type) else f for f in schema],
+                           metadata=schema.metadata)
+    return ds.dataset(path, schema=schema, format="parquet", partitioning="hive")
+
+
+def _swap(tmp, target):
+    """Make the table written at `tmp` the one at `target` with a single rename."""
+    if not os.path.isdir(tmp) and not os.path.isdir(target):
+        os.replace(tmp, target)
+        return
+    # a directory can't be renamed over another one: move the table into the
+    # versions directory and repoint the `target` symlink instead
+    versions = target + ".versions"
+    os.makedirs(versions, exist_ok=True)
+    previous = os.path.basename(os.readlink(target)) if os.path.islink(target) else None
+    current = uuid.uuid4().hex
+    os.replace(tmp, os.path.join(versions, current))
+    link = f"{target}.link-{os.getpid()}"
+    _remove(link)
+    os.symlink(os.path.relpath(os.path.join(versions, current), os.path.dirname(target) or "."), link)
+    os.replace(link, target)
+    for name in os.listdir(versions):
+        if name not in (current, previous):
+            _remove(os.path.join(versions, name))
+
+
+def _max_files(path):
+    """Most data files in any one partition directory of a table."""
+    return max((sum(name.endswith(".parquet") for name in files) for _, _, files in os.walk(path)), default=0)
+
+
+def _remove(path):
+    if os.path.islink(path) or os.path.isfile(path):
+        os.remove(path)
+    elif os.path.isdir(path):
+        shutil.rmtree(path)
+
+
+def _flatten(filters):
+    if not filters:
+        return []
+    if isinstance(filters[0], tuple):
+        return list(filters)
+    return [f for group in filters for f in group]
+
+
+def _mask(df, filters):
+    """Evaluate DNF filters with pandas for the CSV fallback."""
+    groups = [filters] if isinstance(filters[0], tuple) else filters
+    mask = pd.Series(False, index=df.index)
+    for group in groups:
+        m = pd.Series(True, index=df.index)
+        for col, op, value in group:
+            s = df[col]
+            if op in ("=", "=="):
+                m &= s == value
+            elif op == "!=":
+                m &= s != value
+            elif op == "<":
+                m &= s < value
+            elif op == "<=":
+                m &= s <= value
+            elif op == ">":
+                m &= s > value
+            elif op == ">=":
+                m &= s >= value
+            elif op == "in":
+                m &= s.isin(value)
+            elif op == "not in":
+                m &= ~s.isin(value)
+            else:
+                raise ValueError(f"Unsupported filter op {op!r}")
+        mask |= m
+    return mask.to_numpy()
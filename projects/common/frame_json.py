@@ -0,0 +1,152 @@
+"""Serialize column arrays or DataFrames to response bytes without per-row dicts.
+
+The old routes built one dict per row with ``to_dict(orient="records")``, and
+FastAPI's `jsonable_encoder` then walked every value again. Here each column
+is encoded to JSON tokens once, with a vectorized pass per dtype. Rows are
+then stitched together with a fixed ``%`` template, so neither step touches
+a per-row Python dict. The encoding rules are:
+
+- NaN, NaT and +-inf become ``null``
+- datetimes become ISO strings, as FastAPI renders them
+- numpy scalars become plain numbers
+
+Formats:
+    records   ``[{"col": v, ...}, ...]`` (the default, same shape as before)
+    columnar  ``{"col": [v, ...], ...}``
+    arrow     Arrow IPC stream, for clients with pyarrow / arrow-js
+"""
+import datetime
+import json
+from json.encoder import encode_basestring_ascii
+
+import numpy as np
+from starlette.responses import Response
+
+from projects.common.startup import lazy_import
+from projects.common.stats import span
+
+pd = lazy_import("pandas")
+pa = lazy_import("pyarrow")
+
+FORMATS = ("records", "columnar", "arrow")
+FORMAT_PATTERN = "^(" + "|".join(FORMATS) + ")$"  # for a `format` Query parameter
+MEDIA_TYPES = {"records": "application/json", "columnar": "application/json",
+               "arrow": "application/vnd.apache.arrow.stream"}
+ROW_HEADER = "X-Row-Count"  # counted by telemetry.TelemetryMiddleware
+
+
+def json_default(o):
+    if isinstance(o, (datetime.datetime, datetime.date)):
+        return o.isoformat()
+    if isinstance(o, np.generic):
+        return o.item()
+    raise TypeError(f"{type(o).__name__} is not JSON serializable")
+
+
+def dumps(content):
+    """Compact JSON bytes for plain Python content, with the same rules as `encode_column`."""
+    return json.dumps(content, separators=(",", ":"), allow_nan=False, default=json_default).encode()
+
+
+def frame_columns(df):
+    """{name: array} view of a DataFrame's columns (extension arrays kept as they are)."""
+    return {name: df[name].array if pd.api.types.is_extension_array_dtype(df[name].dtype) else df[name].to_numpy()
+            for name in df.columns}
+
+
+def encode_column(values):
+    """One JSON token (str) per value of a 1-D array (numpy, Categorical or nullable int)."""
+    if isinstance(values, pd.Categorical):
+        # each distinct value is encoded once; code -1 (missing) picks the trailing null
+        tokens = np.array(encode_column(np.asarray(values.categories)) + ["null"], dtype=object)
+        return tokens[values.codes].tolist()
+    if isinstance(values, pd.api.extensions.ExtensionArray) and values.dtype.kind in "iub":
+        tokens = encode_column(values.to_numpy(dtype=values.dtype.numpy_dtype, na_value=0))
+        for i in np.flatnonzero(values.isna()).tolist():
+            tokens[i] = "null"
+        return tokens
+    values = np.asarray(values)
+    kind = values.dtype.kind
+    if kind in "iu":
+        return list(map(str, values.tolist()))
+    if kind == "b":
+        return np.where(values, "true", "false").tolist()
+    if kind == "f":
+        tokens = list(map(float.__repr__, values.astype(float).tolist()))
+        for i in np.flatnonzero(~np.isfinite(values)).tolist():
+            tokens[i] = "null"
+        return tokens
+    if kind == "M":
+        # like datetime.isoformat(): microseconds only when there are any
+        text = np.datetime_as_string(values, unit="s").tolist()
+        nat = np.isnat(values)
+        for i in np.flatnonzero((values.astype("datetime64[s]") != values) & ~nat).tolist():
+            text[i] = np.datetime_as_string(values[i], unit="us")
+        tokens = ['"%s"' % t for t in text]
+        for i in np.flatnonzero(nat).tolist():
+            tokens[i] = "null"
+        return tokens
+    missing = pd.isna(values).tolist()
+    return ["null" if na else encode_basestring_ascii(v) if isinstance(v, str)
+            else json.dumps(v, allow_nan=False, default=json_default)
+            for v, na in zip(values.tolist(), missing)]
+
+
+def records_json(columns):
+    """``[{"col": v, ...}, ...]`` as bytes, built column by column."""
+    names = list(columns)
+    if not names:
+        return b"[]"
+    template = "{" + ",".join(encode_basestring_ascii(n).replace("%", "%%") + ":%s" for n in names) + "}"
+    tokens = [encode_column(columns[n]) for n in names]
+    return ("[" + ",".join(map(template.__mod__, zip(*tokens))) + "]").encode()
+
+
+def columnar_json(columns):
+    """``{"col": [v, ...], ...}`` as bytes."""
+    return ("{" + ",".join(encode_basestring_ascii(n) + ":[" + ",".join(encode_column(v)) + "]"
+                           for n, v in columns.items()) + "}").encode()
+
+
+def arrow_ipc(columns):
+    """Arrow IPC stream with one record batch."""
+    table = pa.table({n: _arrow_array(v) for n, v in columns.items()})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _arrow_array(values):
+    try:
+        return pa.array(values, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # mixed-type object column: ship it as strings
+        return pa.array([None if na else str(v) for v, na in zip(values.tolist(), pd.isna(values).tolist())])
+
+
+def _row_count(content):
+    if isinstance(content, pd.DataFrame):
+        return len(content)
+    return len(next(iter(content.values()))) if content else 0
+
+
+ENCODERS = {"records": records_json, "columnar": columnar_json, "arrow": arrow_ipc}
+
+
+class FrameResponse(Response):
+    """Response for a DataFrame or a {name: array} mapping in one of `FORMATS`."""
+
+    def __init__(self, content, format="records", **kwargs):
+        if format not in ENCODERS:
+            raise ValueError(f"Unknown format {format!r}; expected one of {FORMATS}")
+        self.format = format
+        self.media_type = MEDIA_TYPES[format]
+        super().__init__(content, **kwargs)
+        self.headers[ROW_HEADER] = str(_row_count(content))
+
+    def render(self, content):
+        with span("serialize"):
+            if isinstance(content, pd.DataFrame):
+                content = frame_columns(content)
+            return ENCODERS[self.format](content)
@@ -0,0 +1,160 @@
+"""Load-once registry for model artifacts served by the prediction APIs.
+
+Each artifact is deserialized once and handed out as an immutable
+`ModelHandle`. `get()` stats the file on every call (cheap) and, if it
+changed on disk, loads the new file and swaps the handle in one assignment.
+Requests that already hold the old handle keep using that model until they
+finish; only later calls see the new one.
+
+An artifact registered with ``lazy=True`` is skipped by `load_all()` and
+loaded by its first `get()`. The APIs register their sklearn pipelines that
+way: requests are served by the memory-mapped fast-path plans, so a worker
+only unpickles a pipeline if its plan is missing.
+
+An artifact registered with a `source` was built from another file (a plan
+from its .joblib). A change to either file reloads it, and its loader is
+called with both paths, so it can refuse to pair with a different source.
+"""
+import hashlib
+import os
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from projects.common.startup import lazy_import
+from projects.common.stats import span
+
+joblib = lazy_import("joblib")
+
+
+@dataclass(frozen=True)
+class ModelHandle:
+    name: str
+    path: str
+    model: object
+    sha256: str
+    stat: tuple
+    loaded_at: str
+    source_stat: tuple = None
+
+    @property
+    def version(self):
+        return self.sha256[:12]
+
+    def describe(self):
+        return {"version": self.version, "sha256": self.sha256, "loaded_at": self.loaded_at}
+
+
+def save_model(model, path):
+    """joblib.dump to a temp file and rename, so readers never see a partial artifact."""
+    tmp = f"{path}.tmp-{os.getpid()}"
+    joblib.dump(model, tmp)
+    os.replace(tmp, path)
+    return path
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    """sha256 of a file, read in chunks."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _joblib_loader(path, mmap_mode="r"):
+    """Hash `path` in chunks, then load it with its NumPy arrays memory-mapped.
+
+    The file is read twice instead of held in memory, so the load is retried
+    if the file was replaced in between and the hash would not match it.
+    """
+    while True:
+        before = _stat(path)
+        sha256 = file_sha256(path)
+        model = joblib.load(path, mmap_mode=mmap_mode)
+        if _stat(path) == before:
+            return model, sha256
+
+
+class ModelRegistry:
+    def __init__(self):
+        self._paths = {}
+        self._loaders = {}
+        self._sources = {}
+        self._lazy = set()
+        self._handles = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, path, loader=_joblib_loader, lazy=False, source=None):
+        """Declare an artifact. `loader(path)`, or `loader(path, source)`, returns (model, sha256)."""
+        self._paths[name] = path
+        self._loaders[name] = loader
+        self._sources[name] = source
+        if lazy:
+            self._lazy.add(name)
+        return self
+
+    def load_all(self):
+        """Load every registered non-lazy artifact that exists; called at startup."""
+        for name, path in self._paths.items():
+            if name not in self._lazy and os.path.exists(path):
+                self.get(name)
+        return self
+
+    def get(self, name):
+        """Current handle for `name`, reloading first if the file changed."""
+        path = self._paths[name]
+        handle = self._handles.get(name)
+        try:
+            stat = _stat(path)
+        except FileNotFoundError:
+            if handle is None:
+                raise
+            return handle  # file is being replaced; keep serving the old model
+        source = self._sources[name]
+        source_stat = source and _stat_or_none(source)
+        if handle is not None and (handle.stat, handle.source_stat) == (stat, source_stat):
+            return handle
+
+        with self._lock:
+            handle = self._handles.get(name)
+            if handle is None or (handle.stat, handle.source_stat) != (stat, source_stat):
+                with span("model_load"):
+                    model, sha256 = self._loaders[name](path, source) if source else self._loaders[name](path)
+                handle = ModelHandle(name, path, model, sha256, stat,
+                                     datetime.now(timezone.utc).isoformat(timespec="seconds"), source_stat)
+                self._handles[name] = handle
+        return handle
+
+    def version(self, *names):
+        """Tuple of tokens for the named artifacts' files (None where missing), for cache keys.
+
+        A token is derived from the file's stat only, so this never loads or
+        reads a model and is safe to call on the event loop. A replaced file
+        gets a new token before anything reloads it.
+        """
+        versions = []
+        for name in names:
+            try:
+                stat = _stat(self._paths[name])
+            except FileNotFoundError:
+                handle = self._handles.get(name)  # being replaced; the old model is still served
+                stat = handle and handle.stat
+            versions.append(stat and "%x-%x-%x" % stat)
+        return tuple(versions)
+
+    def versions(self):
+        """Loaded version info per artifact, for /health."""
+        return {name: h.describe() for name, h in self._handles.items()}
+
+
+def _stat(path):
+    st = os.stat(path)
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def _stat_or_none(path):
+    try:
+        return _stat(path)
+    except FileNotFoundError:
+        return None
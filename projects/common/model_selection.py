@@ -0,0 +1,130 @@
+"""Shared model-selection harness for the train_models scripts.
+
+`select_model()` scores every candidate estimator with k-fold CV:
+
+* each preprocessing step is fitted once per fold, and its transformed
+  train/test matrices are reused by every candidate that uses it instead
+  of being refit inside each pipeline;
+* the per-fold preprocessing fits and the (candidate, fold) fits run in a
+  joblib (loky) process pool, so candidates and folds train concurrently.
+  Arrays above `MMAP_BYTES` (X's numeric columns, the fold matrices) are
+  handed to the workers as read-only memmaps instead of being pickled
+  into every task;
+* a leaderboard with per-model metrics (mean and std over folds) and
+  fit/score timings is written next to the chosen model.
+
+The winner is refit as ``Pipeline([("pre", pre), ("model", estimator)])``
+(or the bare estimator when it has no preprocessing) on all rows and saved with `save_model`, after removing the fast-path plan of the
+model it replaces. Ties go to the earlier candidate.
+"""
+import os
+import time
+import warnings
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.exceptions import UndefinedMetricWarning
+from sklearn.metrics import get_scorer
+from sklearn.model_selection import KFold, StratifiedKFold
+from sklearn.pipeline import Pipeline
+
+from projects.common.fastpath import discard_plan
+from projects.common.model_registry import save_model
+
+FOLDS = 5
+MMAP_BYTES = "1M"
+
+
+def leaderboard_path(model_path):
+    """`models/classifier.joblib` -> `models/classifier.leaderboard.csv`."""
+    return os.path.splitext(model_path)[0] + ".leaderboard.csv"
+
+
+def _fit_pre(pre, X, y, train, test):
+    if pre is None:
+        return np.asarray(X.iloc[train]), np.asarray(X.iloc[test])
+    pre = clone(pre)
+    return pre.fit_transform(X.iloc[train], y.iloc[train]), pre.transform(X.iloc[test])
+
+
+def _fit_candidate(estimator, metrics, X_train, y_train, X_test, y_test):
+    t = time.perf_counter()
+    model = clone(estimator).fit(X_train, y_train)
+    fit_time = time.perf_counter() - t
+    t = time.perf_counter()
+    scores = {}
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UndefinedMetricWarning)  # precision of a fold with no positive predictions is 0
+        for name in metrics:
+            try:
+                scores[name] = get_scorer(name)(model, X_test, y_test)
+            except ValueError:  # e.g. roc_auc on a fold with one class
+                scores[name] = np.nan
+    return scores, fit_time, time.perf_counter() - t
+
+
+def _splits(X, y, folds, stratify, seed):
+    if stratify:
+        counts = y.value_counts()
+        rarest = int(counts.min())
+        if rarest >= 2:
+            if rarest < folds:
+                print(f"Stratified CV: {folds} folds capped to {rarest} by class {counts.idxmin()!r}")
+            return list(StratifiedKFold(min(folds, rarest), shuffle=True, random_state=seed).split(X, y))
+        print(f"Stratified CV: class {counts.idxmin()!r} has {rarest} row(s); falling back to unstratified KFold")
+    return list(KFold(folds, shuffle=True, random_state=seed).split(X))
+
+
+def select_model(X, y, candidates, model_path, pre=None, metrics=("r2",), folds=FOLDS,
+                 stratify=False, n_jobs=None, seed=42):
+    """Cross-validate `candidates` ({name: estimator}), save the best and return (model, leaderboard).
+
+    `pre` is the preprocessing step of every candidate, or a dict giving each
+    candidate its own (None or a missing name: the raw columns). `metrics`
+    are sklearn scorer names; the first one picks the winner (higher is
+    better). With `stratify` the fold count is capped by the rarest class;
+    if that class has a single row, plain KFold is used instead.
+    """
+    metrics = list(metrics)
+    pres = {name: (pre.get(name) if isinstance(pre, dict) else pre) for name in candidates}
+    # one preprocessing fit per fold for each distinct step, shared by the candidates using it
+    steps = list({id(step): step for step in pres.values()}.values())
+    splits = _splits(X, y, folds, stratify, seed)
+    y_folds = [(y.iloc[train], y.iloc[test]) for train, test in splits]
+    with Parallel(n_jobs=n_jobs or -1, max_nbytes=MMAP_BYTES, mmap_mode="r") as parallel:
+        fitted = parallel(delayed(_fit_pre)(step, X, y, train, test) for step in steps for train, test in splits)
+        matrices = {(id(step), k): fitted[j * len(splits) + k] for j, step in enumerate(steps) for k in range(len(splits))}
+        keys = [(name, k) for name in candidates for k in range(len(splits))]
+        fits = parallel(delayed(_fit_candidate)(candidates[name], metrics, matrices[id(pres[name]), k][0], y_folds[k][0],
+                                                matrices[id(pres[name]), k][1], y_folds[k][1]) for name, k in keys)
+        results = dict(zip(keys, fits))
+
+    rows = []
+    for name in candidates:
+        fold_results = [results[name, k] for k in range(len(splits))]
+        row = {"model": name, "folds": len(splits)}
+        for metric in metrics:
+            values = np.array([scores[metric] for scores, _, _ in fold_results], dtype=float)
+            row[f"{metric}_mean"] = np.nanmean(values) if np.isfinite(values).any() else np.nan
+            row[f"{metric}_std"] = np.nanstd(values) if np.isfinite(values).any() else np.nan
+        row["fit_seconds"] = sum(fit for _, fit, _ in fold_results)
+        row["score_seconds"] = sum(score for _, _, score in fold_results)
+        rows.append(row)
+    board = pd.DataFrame(rows)
+    key = f"{metrics[0]}_mean"
+    best = board[key].fillna(-np.inf).to_numpy().argmax()
+    board["chosen"] = board.index == best
+    board = board.sort_values(key, ascending=False, kind="mergesort", na_position="last")
+
+    name = rows[best]["model"]
+    t = time.perf_counter()
+    if pres[name] is None:
+        model = clone(candidates[name]).fit(X, y)
+    else:
+        model = Pipeline([("pre", clone(pres[name])), ("model", clone(candidates[name]))]).fit(X, y)
+    board.loc[board["model"] == name, "refit_seconds"] = time.perf_counter() - t
+    discard_plan(model_path)  # the caller exports a new one once the model is saved
+    save_model(model, model_path)
+    board.to_csv(leaderboard_path(model_path), index=False)
+    return model, board
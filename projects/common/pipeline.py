@@ -0,0 +1,349 @@
+"""Content-addressed DAG runner for the three project pipelines.
+
+Each `Stage` is one script with declared inputs (data files or directories)
+and outputs. The runner:
+
+* orders stages by their data dependencies (a stage that reads another
+  stage's output runs after it) and runs independent ones, i.e. the three
+  projects, in parallel;
+* hashes the script, its arguments, the content of every input and of every
+  local module the script imports (found by parsing its imports, recursively:
+  flat imports from its own directory and ``projects.*`` modules), and skips the stage when that digest and its outputs match the last
+  successful run. Stages marked `always` (the network fetches) run every
+  time; whatever they download is content-hashed by the stages after them,
+  so an unchanged download stops the chain there;
+* runs every stage as a subprocess, logs its output to
+  ``.pipeline/logs/<project>.<stage>.log`` and appends wall time, the script
+  process's peak RSS and status to ``.pipeline/runs.jsonl``;
+* keeps going when a stage fails (or the runner raises while handling it):
+  the stages after it are marked skipped, the independent ones still run,
+  and a single `PipelineError` listing every failure is raised at the end.
+
+File digests are cached by (size, mtime) in ``.pipeline/state.json``, so
+unchanged multi-GB inputs are not re-read on every run.
+
+Usage:
+    python projects/common/pipeline.py                   # everything
+    python projects/common/pipeline.py --project covid --no-fetch
+    python projects/common/pipeline.py --dry-run
+    python projects/common/pipeline.py --force --jobs 1
+"""
+import argparse
+import ast
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+STATE_DIR = os.path.join(ROOT, ".pipeline")
+STATE = os.path.join(STATE_DIR, "state.json")
+RUN_LOG = os.path.join(STATE_DIR, "runs.jsonl")
+
+
+class PipelineError(RuntimeError):
+    """One or more stages failed; `records` is the full run log of the run."""
+
+    def __init__(self, message, records):
+        super().__init__(message)
+        self.records = records
+
+
+@dataclass(frozen=True)
+class Stage:
+    """`script`, `inputs` and `outputs` are paths relative to the project directory."""
+    project: str
+    name: str
+    script: str
+    inputs: tuple = ()
+    outputs: tuple = ()
+    args: tuple = ()
+    always: bool = False
+    csv_flag: bool = False  # accepts --no-csv
+
+    @property
+    def id(self):
+        return f"{self.project}.{self.name}"
+
+    def path(self, rel):
+        if rel.startswith("projects/"):
+            return os.path.join(ROOT, rel)
+        return os.path.join(ROOT, "projects", self.project, rel)
+
+
+def _module_file(name, directory):
+    """Local source file for an imported module name, or None for third-party/stdlib modules."""
+    parts = name.split(".")
+    base = ROOT if parts[0] == "projects" else directory
+    for candidate in (os.path.join(base, *parts) + ".py", os.path.join(base, *parts, "__init__.py")):
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+
+def local_imports(script):
+    """Paths (relative to ROOT) of the local modules `script` imports, directly or transitively."""
+    seen, todo = set(), [os.path.abspath(script)]
+    while todo:
+        path = todo.pop()
+        with open(path) as f:
+            tree = ast.parse(f.read(), path)
+        names = []
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names += [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                # `from pkg import mod` may name a submodule as well as an attribute
+                names += [node.module] + [f"{node.module}.{alias.name}" for alias in node.names]
+        for name in names:
+            found = _module_file(name, os.path.dirname(path))
+            if found and found not in seen:
+                seen.add(found)
+                todo.append(found)
+    seen.discard(os.path.abspath(script))
+    return sorted(os.path.relpath(path, ROOT) for path in seen)
+
+
+FOOTBALL, EXO, COVID = "football-rookie-analysis", "exoplanet-habitability", "covid19-dashboard"
+
+STAGES = [
+    Stage(FOOTBALL, "fetch", "src/fetch_data.py", ("data/raw/sample_rookies.csv",), ("data/raw/rookies.csv",), always=True),
+    # rewrites rookies.csv in place when it filters, so its inputs are re-hashed after each run
+    Stage(FOOTBALL, "analyze", "src/analyze_rookies.py", ("data/raw/rookies.csv",), ("data/raw/rookies_filtered.csv",)),
+    Stage(FOOTBALL, "preprocess", "src/preprocess.py", ("data/raw/rookies_filtered.csv",),
+          ("data/processed/rookie_features.parquet",), csv_flag=True),
+    Stage(FOOTBALL, "train", "src/train_models.py", ("data/processed/rookie_features.parquet",),
+          ("models/regression.joblib", "models/classification.joblib")),
+
+    Stage(EXO, "fetch", "src/fetch_data.py", ("data/raw/sample_exoplanets.csv",), ("data/raw/exoplanets.csv",), always=True),
+    Stage(EXO, "preprocess", "src/preprocess.py", ("data/raw/exoplanets.csv",),
+          ("data/processed/exoplanets_clean.parquet",), csv_flag=True),
+    Stage(EXO, "train", "src/train_models.py", ("data/processed/exoplanets_clean.parquet",),
+          ("models/classifier.joblib",)),
+
+    Stage(COVID, "fetch", "src/fetch_data.py", (), ("data/raw/covid_owid.csv",), always=True),
+    Stage(COVID, "build_features", "src/build_features.py", ("data/raw/covid_owid.csv",),
+          ("data/processed/covid_features.parquet", "data/processed/covid_features_state.parquet",
+           "data/processed/covid_rollups.parquet"),
+          args=("--incremental",), csv_flag=True),
+]
+
+
+class Digests:
+    """sha256 of files and directories, memoized by (size, mtime_ns)."""
+
+    def __init__(self, cache):
+        self.cache = cache
+        self._lock = threading.Lock()
+
+    def file(self, path):
+        st = os.stat(path)
+        key, name = [st.st_size, st.st_mtime_ns], os.path.relpath(path, ROOT)
+        with self._lock:
+            hit = self.cache.get(name)
+        if hit and hit[:2] == key:
+            return hit[2]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        with self._lock:
+            self.cache[name] = key + [h.hexdigest()]
+        return h.hexdigest()
+
+    def path(self, path):
+        """Digest of a file or directory tree; None if missing.
+
+        Directory digests cover each subdirectory name and the sorted digests
+        of its files but not file names, which Parquet datasets randomize.
+        """
+        if os.path.isfile(path):
+            return self.file(path)
+        if not os.path.isdir(path):
+            return None
+        h = hashlib.sha256()
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            files = sorted(self.file(os.path.join(dirpath, name)) for name in filenames)
+            h.update(os.path.relpath(dirpath, path).encode() + b"\0" + ",".join(files).encode() + b"\n")
+        return h.hexdigest()
+
+
+def stage_digest(stage, digests, args):
+    h = hashlib.sha256(json.dumps([stage.script, list(args)]).encode())
+    for rel in (stage.script,) + stage.inputs:
+        h.update(f"{rel}\0{digests.path(stage.path(rel))}\n".encode())
+    for rel in local_imports(stage.path(stage.script)):
+        h.update(f"{rel}\0{digests.file(os.path.join(ROOT, rel))}\n".encode())
+    return h.hexdigest()
+
+
+def output_digests(stage, digests):
+    return {rel: digests.path(stage.path(rel)) for rel in stage.outputs}
+
+
+def dependencies(stages):
+    """stage id -> ids of the stages producing any of its inputs."""
+    producers = {stage.path(rel): stage.id for stage in stages for rel in stage.outputs}
+    return {stage.id: {producers[stage.path(rel)] for rel in stage.inputs
+                       if producers.get(stage.path(rel)) not in (None, stage.id)}
+            for stage in stages}
+
+
+def execute(stage, args):
+    """Run the stage's script; returns (exit code, wall seconds, peak RSS in MB or None)."""
+    os.makedirs(os.path.join(STATE_DIR, "logs"), exist_ok=True)
+    log = os.path.join(STATE_DIR, "logs", f"{stage.id}.log")
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    t = time.perf_counter()
+    with open(log, "w") as out:
+        proc = subprocess.Popen([sys.executable, stage.path(stage.script), *args],
+                                cwd=os.path.dirname(stage.path(stage.script)), env=env,
+                                stdout=out, stderr=subprocess.STDOUT)
+        if hasattr(os, "wait4"):
+            _, status, usage = os.wait4(proc.pid, 0)
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            # ru_maxrss is KiB on Linux, bytes on macOS
+            peak = usage.ru_maxrss / (1 << 20 if sys.platform == "darwin" else 1 << 10)
+        else:
+            proc.wait()
+            peak = None
+    return proc.returncode, time.perf_counter() - t, peak
+
+
+def run(stages, force=False, no_fetch=False, no_csv=False, dry_run=False, jobs=None):
+    """Run `stages` in dependency order; returns the run log records.
+
+    Raises `PipelineError` after the run log is written if any stage failed.
+    """
+    state = {"files": {}, "stages": {}}
+    if os.path.exists(STATE):
+        with open(STATE) as f:
+            state = json.load(f)
+    digests = Digests(state["files"])
+    deps = dependencies(stages)
+    by_id = {stage.id: stage for stage in stages}
+    run_id, records, lock = uuid.uuid4().hex[:12], [], threading.Lock()
+
+    def save():
+        os.makedirs(STATE_DIR, exist_ok=True)
+        tmp = f"{STATE}.tmp-{os.getpid()}"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp, STATE)
+
+    def step(stage):
+        args = list(stage.args) + (["--no-csv"] if no_csv and stage.csv_flag else [])
+        record = {"run_id": run_id, "stage": stage.id, "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds")}
+        if stage.always and no_fetch:
+            return dict(record, status="skipped", reason="--no-fetch")
+        digest = stage_digest(stage, digests, args)
+        previous = state["stages"].get(stage.id, {})
+        outputs = output_digests(stage, digests)
+        if (not force and not stage.always and previous.get("digest") == digest
+                and None not in outputs.values() and previous.get("outputs") == outputs):
+            return dict(record, status="skipped", reason="unchanged", digest=digest[:12])
+        if dry_run:
+            return dict(record, status="would run", digest=digest[:12])
+        code, wall, peak = execute(stage, args)
+        record.update(wall_seconds=round(wall, 3), peak_rss_mb=peak and round(peak, 1))
+        outputs = output_digests(stage, digests)
+        if code != 0 or None in outputs.values():
+            missing = [rel for rel, d in outputs.items() if d is None]
+            return dict(record, status="failed", exit_code=code, missing_outputs=missing)
+        # re-hash: a stage may rewrite its own inputs (analyze_rookies does)
+        digest = stage_digest(stage, digests, args)
+        with lock:
+            state["stages"][stage.id] = {"digest": digest, "outputs": outputs, "finished_at": datetime.now(timezone.utc).isoformat(timespec="seconds")}
+            save()
+        return dict(record, status="ran", digest=digest[:12])
+
+    done, failed, futures = set(), set(), {}
+    with ThreadPoolExecutor(max_workers=jobs or len(stages) or 1) as pool:
+        while len(done) + len(failed) < len(stages):
+            for stage in stages:
+                sid = stage.id
+                if sid in done or sid in failed or sid in futures.values():
+                    continue
+                if deps[sid] & failed:
+                    failed.add(sid)
+                    record = {"run_id": run_id, "stage": sid, "status": "skipped",
+                              "reason": "after failed " + ", ".join(sorted(deps[sid] & failed))}
+                    records.append(record)
+                    print(format_record(record, stage), flush=True)
+                elif deps[sid] <= done:
+                    futures[pool.submit(step, stage)] = sid
+            if not futures:
+                if len(done) + len(failed) < len(stages):
+                    raise ValueError("Stage dependencies form a cycle")
+                break
+            finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in finished:
+                sid = futures.pop(future)
+                try:
+                    record = future.result()
+                except Exception as e:
+                    record = {"run_id": run_id, "stage": sid, "status": "failed", "error": f"{type(e).__name__}: {e}"}
+                records.append(record)
+                (failed if record["status"] == "failed" else done).add(sid)
+                print(format_record(record, by_id[sid]), flush=True)
+
+    if not dry_run:
+        os.makedirs(STATE_DIR, exist_ok=True)
+        with lock:
+            save()
+        with open(RUN_LOG, "a") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+    errors = [record for record in records if record["status"] == "failed"]
+    if errors:
+        raise PipelineError(f"{len(errors)} of {len(stages)} stages failed: "
+                            + "; ".join(" ".join(format_record(record, by_id[record["stage"]]).split()) for record in errors),
+                            records)
+    return records
+
+
+def format_record(record, stage):
+    line = f"{record['stage']:<42} {record['status']:<10}"
+    if "wall_seconds" in record:
+        peak = f"{record['peak_rss_mb']:.0f} MB" if record.get("peak_rss_mb") else "n/a"
+        line += f" {record['wall_seconds']:8.2f}s  peak {peak}"
+    if record.get("reason"):
+        line += f" ({record['reason']})"
+    if record.get("error"):
+        line += f" {record['error']}"
+    elif record["status"] == "failed":
+        line += f" exit {record['exit_code']}, see .pipeline/logs/{stage.id}.log"
+    return line
+
+
+if __name__ == "__main__":
+    projects = sorted({stage.project for stage in STAGES})
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--project", action="append", help=f"one of {projects} (or a prefix); repeatable")
+    parser.add_argument("--force", action="store_true", help="ignore the cache and run every stage")
+    parser.add_argument("--no-fetch", action="store_true", help="use the raw files on disk instead of fetching")
+    parser.add_argument("--no-csv", action="store_true", help="skip the Tableau CSV exports")
+    parser.add_argument("--dry-run", action="store_true", help="only report which stages would run")
+    parser.add_argument("--jobs", type=int, default=None)
+    args = parser.parse_args()
+
+    stages = [s for s in STAGES if not args.project or any(s.project.startswith(p) for p in args.project)]
+    if not stages:
+        parser.error(f"no stages match {args.project}")
+    t = time.perf_counter()
+    try:
+        records, error = run(stages, args.force, args.no_fetch, args.no_csv, args.dry_run, args.jobs), None
+    except PipelineError as e:
+        records, error = e.records, e
+    print(f"{len(records)} stages in {time.perf_counter() - t:.1f}s"
+          + ("" if args.dry_run else f", run log appended to {os.path.relpath(RUN_LOG, ROOT)}"))
+    if error:
+        sys.exit(str(error))
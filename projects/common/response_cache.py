@@ -0,0 +1,139 @@
+"""Byte-bounded LRU of serialized JSON responses, with ETags.
+
+An entry is keyed on the route, its query parameters, an optional request
+body (for prediction payloads) and a version token for whatever the
+response is derived from: `table_version()` of a feature table or
+`ModelRegistry.version()` of the model artifacts. A rewritten table or
+model changes the token, so stale entries are never served. They are also
+dropped the next time the route is hit with the new token.
+
+The JSON is serialized once on a miss and the bytes are reused on every
+hit. Each entry carries a strong ETag (a hash of the bytes), so a client
+sending ``If-None-Match`` gets a 304 without a body.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from starlette.responses import Response
+
+from projects.common.frame_json import json_default, dumps
+from projects.common.stats import span
+
+MAX_BYTES = int(os.environ.get("RESPONSE_CACHE_BYTES", str(64 * 2**20)))
+ENTRY_OVERHEAD = 256  # rough per-entry bookkeeping (key tuple, headers, dict slot)
+
+
+def etag(body):
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def body_key(payload):
+    """Cache-key component for a JSON request payload (order-insensitive)."""
+    return hashlib.blake2b(json.dumps(payload, sort_keys=True, default=json_default).encode(),
+                           digest_size=16).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = self.misses = self.not_modified = self.evictions = self.invalidations = 0
+        self._entries = OrderedDict()  # key -> (body, etag, media_type, headers, size)
+        self._versions = {}  # route -> version token last seen
+        self._lock = threading.Lock()
+
+    def key(self, request, version, body=None):
+        return (request.url.path, tuple(sorted(request.query_params.multi_items())), body, version)
+
+    def respond(self, request, version, compute, body=None):
+        """Cached response for this request, or `compute()` serialized and cached.
+
+        `compute()` returns JSON-ready content or a Response (whose body and
+        headers are cached as they are).
+        """
+        key = self.key(request, version, body)
+        hit = self._get(key)
+        if hit is None:
+            hit = self._put(key, compute())
+        return self._response(request, hit)
+
+    async def respond_async(self, request, version, compute, body=None):
+        """`respond` for an async `compute()`, e.g. a coalesced prediction."""
+        key = self.key(request, version, body)
+        hit = self._get(key)
+        if hit is None:
+            hit = self._put(key, await compute())
+        return self._response(request, hit)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self.bytes, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses, "not_modified": self.not_modified,
+                    "evictions": self.evictions, "invalidations": self.invalidations}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+            self.bytes = 0
+
+    def _get(self, key):
+        route, version = key[0], key[-1]
+        with self._lock:
+            if self._versions.get(route, version) != version:
+                # data or model behind this route changed: drop its old entries
+                stale = [k for k in self._entries if k[0] == route and k[-1] != version]
+                for k in stale:
+                    self.bytes -= self._entries.pop(k)[-1]
+                self.invalidations += len(stale)
+            self._versions[route] = version
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def _put(self, key, content):
+        if isinstance(content, Response):
+            body, media_type = bytes(content.body), content.media_type
+            headers = {k: v for k, v in content.headers.items() if k not in ("content-length", "content-type")}
+        else:
+            with span("serialize"):
+                body, media_type, headers = dumps(content), "application/json", {}
+        size = len(body) + ENTRY_OVERHEAD + sum(len(k) + len(v) for k, v in headers.items())
+        entry = (body, etag(body), media_type, headers, size)
+        if size > self.max_bytes:
+            return entry  # served, but too large to keep
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[-1]
+            self._entries[key] = entry
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= evicted[-1]
+                self.evictions += 1
+        return entry
+
+    def _response(self, request, entry):
+        body, tag, media_type, headers, _ = entry
+        headers = {**headers, "ETag": tag, "Cache-Control": "no-cache"}
+        if _matches(request.headers.get("if-none-match"), tag):
+            with self._lock:
+                self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        return Response(body, media_type=media_type, headers=headers)
+
+
+def _matches(header, tag):
+    if not header:
+        return False
+    tags = [t.strip() for t in header.split(",")]
+    # weak comparison, as RFC 9110 asks for If-None-Match
+    return "*" in tags or tag in tags or f"W/{tag}" in tags
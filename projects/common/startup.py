@@ -0,0 +1,98 @@
+"""Cold-start helpers for the APIs: deferred imports and background pre-warm.
+
+`lazy_import("pandas")` stands in for ``import pandas as pd``. The module
+is imported on first attribute access, so importing an api module does not
+pay for pandas, pyarrow, sklearn or scipy before uvicorn can bind its port.
+
+`Startup` runs an app's warm-up steps (load the model plans and data
+stores, import what the first request needs) and times each one. The
+`API_WARMUP` environment variable picks the mode:
+
+- ``background`` (default): the lifespan starts the steps in a thread and
+  returns at once, so `/health` answers while they run. A request that
+  needs a store before it is warm loads it itself; the stores' own locks
+  keep it from loading twice.
+- ``eager``: the lifespan runs the steps before serving, as before.
+- ``lazy``: no warm-up; everything loads on first use.
+"""
+import importlib
+import os
+import threading
+import time
+import types
+
+MODES = ("background", "eager", "lazy")
+
+
+class LazyModule(types.ModuleType):
+    """Module proxy that imports the module it is named after on first attribute access."""
+
+    def __getattr__(self, attr):
+        module = importlib.import_module(self.__name__)
+        # later lookups find the attributes directly and skip __getattr__
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
+
+def lazy_import(name):
+    return LazyModule(name)
+
+
+class Startup:
+    def __init__(self, mode=None):
+        self.mode = mode or os.environ.get("API_WARMUP", "background")
+        if self.mode not in MODES:
+            raise ValueError(f"API_WARMUP must be one of {MODES}, got {self.mode!r}")
+        self.steps = []
+        self.phases = {}
+        self.errors = {}
+        # CPU seconds the process spent before the app was constructed: mostly imports
+        self.phases["import_cpu"] = time.process_time()
+        self._ready = threading.Event()
+        self._started = None
+
+    def step(self, name, fn):
+        """Add a warm-up step; `fn()` runs in order after the earlier ones."""
+        self.steps.append((name, fn))
+        return self
+
+    def imports(self, *names):
+        """Add a step importing `names`, so the first request does not pay for them."""
+        return self.step("modules", lambda: [importlib.import_module(name) for name in names])
+
+    def start(self):
+        """Run the steps in the configured mode; call from the app's lifespan."""
+        self._started = time.perf_counter()
+        if self.mode == "eager":
+            self._run()
+        elif self.mode == "background":
+            threading.Thread(target=self._run, name="warmup", daemon=True).start()
+        else:
+            self._ready.set()
+        return self
+
+    def _run(self):
+        for name, fn in self.steps:
+            t = time.perf_counter()
+            try:
+                fn()
+            except Exception as e:  # a missing artifact must not stop the other steps
+                self.errors[name] = f"{type(e).__name__}: {e}"
+            self.phases[name] = time.perf_counter() - t
+        self.phases["ready"] = time.perf_counter() - self._started
+        self._ready.set()
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def wait(self, timeout=None):
+        return self._ready.wait(timeout)
+
+    def describe(self):
+        """Mode, readiness and seconds per phase, for /health."""
+        out = {"mode": self.mode, "ready": self.ready,
+               "phases": {name: round(seconds, 4) for name, seconds in self.phases.items()}}
+        if self.errors:
+            out["errors"] = dict(self.errors)
+        return out
@@ -0,0 +1,50 @@
+"""Small in-process statistics used to tune and observe the APIs."""
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# list of (span name, seconds) for the request being served; set by telemetry.TelemetryMiddleware
+SPANS = contextvars.ContextVar("spans", default=None)
+
+
+@contextmanager
+def span(name):
+    """Time the block as step `name` of the current request; no-op outside one."""
+    spans = SPANS.get()
+    if spans is None:
+        yield
+        return
+    t = time.perf_counter()
+    try:
+        yield
+    finally:
+        spans.append((name, time.perf_counter() - t))
+
+
+class Histogram:
+    """Cumulative bucket counts, Prometheus style (`le` = upper bound)."""
+
+    def __init__(self, buckets):
+        self.buckets = sorted(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.sum += value
+
+    def snapshot(self):
+        with self._lock:
+            counts, count, total = list(self.counts), self.count, self.sum
+        cumulative, running = {}, 0
+        for bound, c in zip(self.buckets + ["+Inf"], counts):
+            running += c
+            cumulative[str(bound)] = running
+        return {"buckets": cumulative, "count": count, "sum": total}
@@ -0,0 +1,218 @@
+"""Request instrumentation for the APIs, exported in Prometheus text format.
+
+`Telemetry.install(app)` adds an ASGI middleware and two routes:
+
+- ``/stats/prometheus``: every metric below, for a Prometheus scrape
+- ``/stats/profile?seconds=10``: folded stacks from `SamplingProfiler`, for
+  flamegraph.pl or speedscope. Off unless ``API_PROFILER=1``.
+
+The middleware times each request into a latency histogram per (method,
+route template, status). Code running inside a request can wrap a step in
+``with stats.span("predict"):``. The step's time goes to a per-(route,
+span) histogram, so a slow route shows whether loading, encoding,
+predicting or serializing dominates. Spans are collected through a
+context variable, so they also work in sync handlers run on the thread
+pool and do nothing outside a request. The span names used across the repo are data_load,
+model_load, query, features, predict and serialize.
+
+Responses carrying an ``X-Row-Count`` header (`FrameResponse` sets it) add
+to a rows-returned counter. That includes bodies served from the response
+cache, but not 304s. Other components expose their own numbers through
+`register_stats` (e.g. the response cache's hits and misses) and
+`register_histogram` (the coalescer's batch sizes).
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from fastapi import HTTPException, Query
+from starlette.responses import PlainTextResponse
+
+from projects.common.frame_json import ROW_HEADER
+from projects.common.stats import SPANS, Histogram
+
+LATENCY_BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+ROW_HEADER_BYTES = ROW_HEADER.lower().encode()
+PROFILER_ENABLED = os.environ.get("API_PROFILER", "0") == "1"
+
+
+class Telemetry:
+    def __init__(self, app_name):
+        self.app_name = app_name
+        self.requests = {}  # (method, route, status) -> Histogram
+        self.spans = {}     # (route, span) -> Histogram
+        self.rows = Counter()
+        self.sources = []
+        self.histograms = {}
+        self.profiler = SamplingProfiler()
+        self._routes = {}
+        self._lock = threading.Lock()
+
+    def register_stats(self, prefix, stats, counters=()):
+        """Export the numbers of `stats()` (a flat dict) as `api_<prefix>_<key>`; `counters` are monotonic."""
+        self.sources.append((prefix, stats, set(counters)))
+        return self
+
+    def register_histogram(self, name, histogram):
+        """Export a `stats.Histogram` as `api_<name>`."""
+        self.histograms[name] = histogram
+        return self
+
+    def install(self, app):
+        app.add_middleware(TelemetryMiddleware, telemetry=self)
+
+        @app.get("/stats/prometheus", response_class=PlainTextResponse)
+        def prometheus():
+            return PlainTextResponse(self.render(), media_type="text/plain; version=0.0.4")
+
+        @app.get("/stats/profile", response_class=PlainTextResponse)
+        async def profile(seconds: float = Query(10, gt=0, le=300), interval_ms: float = Query(5, ge=1, le=1000)):
+            """Sample every thread's stack for `seconds`; folded stacks, one "frame;frame;... count" per line."""
+            if not PROFILER_ENABLED:
+                raise HTTPException(status_code=404, detail="Profiler disabled; start the API with API_PROFILER=1")
+            try:
+                # sampled from a thread, so the event loop keeps serving the load being profiled
+                folded = await asyncio.to_thread(self.profiler.capture, seconds, interval_ms / 1000)
+            except RuntimeError as e:
+                raise HTTPException(status_code=409, detail=str(e))
+            return PlainTextResponse(folded)
+        return app
+
+    def observe(self, method, route, status, seconds, spans, rows):
+        request = self.requests.get((method, route, status))
+        if request is None:
+            with self._lock:
+                request = self.requests.setdefault((method, route, status), Histogram(LATENCY_BUCKETS))
+        request.observe(seconds)
+        for name, elapsed in spans:
+            hist = self.spans.get((route, name))
+            if hist is None:
+                with self._lock:
+                    hist = self.spans.setdefault((route, name), Histogram(LATENCY_BUCKETS))
+            hist.observe(elapsed)
+        if rows and status < 300:  # a 304 carries the header but no rows
+            with self._lock:
+                self.rows[route] += rows
+
+    def route(self, scope):
+        """Route template the router matched (scope["endpoint"]), so labels stay bounded."""
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        path = self._routes.get(endpoint)
+        if path is None:
+            for r in getattr(scope.get("app"), "routes", ()):
+                if getattr(r, "endpoint", None) is endpoint:
+                    path = r.path
+                    break
+            path = self._routes.setdefault(endpoint, path or getattr(endpoint, "__name__", "unknown"))
+        return path
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        app = {"app": self.app_name}
+        with self._lock:  # the middleware adds series while this runs on the thread pool
+            requests, spans, rows = sorted(self.requests.items()), sorted(self.spans.items()), sorted(self.rows.items())
+        out = []
+        _histograms(out, "api_request_duration_seconds", "Request latency by route and status.",
+                    [({**app, "method": m, "route": r, "status": str(s)}, h) for (m, r, s), h in requests])
+        _histograms(out, "api_span_duration_seconds", "Time spent in named steps of a request.",
+                    [({**app, "route": r, "span": n}, h) for (r, n), h in spans])
+        _metric(out, "api_rows_returned_total", "counter", "Rows in table responses (X-Row-Count).",
+                [({**app, "route": r}, n) for r, n in rows])
+        for prefix, stats, counters in self.sources:
+            for key, value in stats().items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    counter = key in counters
+                    name = f"api_{prefix}_{key}" + ("_total" if counter else "")
+                    _metric(out, name, "counter" if counter else "gauge", f"{prefix} {key}.", [(app, value)])
+        for name, hist in sorted(self.histograms.items()):
+            _histograms(out, f"api_{name}", f"{name}.", [(app, hist)])
+        return "\n".join(out) + "\n"
+
+
+class TelemetryMiddleware:
+    """Pure ASGI middleware: times the request and collects its spans and row count."""
+
+    def __init__(self, app, telemetry):
+        self.app = app
+        self.telemetry = telemetry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        spans, status, rows = [], [500], [0]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                for name, value in message.get("headers", ()):
+                    if name == ROW_HEADER_BYTES:
+                        rows[0] = int(value)
+            await send(message)
+
+        token = SPANS.set(spans)
+        t = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - t
+            SPANS.reset(token)
+            self.telemetry.observe(scope["method"], self.telemetry.route(scope), status[0], elapsed, spans, rows[0])
+
+
+class SamplingProfiler:
+    """Samples the stacks of all threads at an interval and counts them as folded stacks."""
+
+    def __init__(self):
+        self._busy = threading.Lock()
+
+    def capture(self, seconds, interval):
+        if not self._busy.acquire(blocking=False):
+            raise RuntimeError("A profile is already being captured")
+        try:
+            me, counts = threading.get_ident(), Counter()
+            names = {t.ident: t.name for t in threading.enumerate()}
+            deadline = time.perf_counter() + seconds
+            while time.perf_counter() < deadline:
+                for ident, frame in sys._current_frames().items():
+                    if ident == me:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        code = frame.f_code
+                        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                        frame = frame.f_back
+                    stack.append(names.get(ident, f"thread-{ident}"))
+                    counts[";".join(reversed(stack))] += 1
+                time.sleep(interval)
+        finally:
+            self._busy.release()
+        return "".join(f"{stack} {n}\n" for stack, n in counts.most_common())
+
+
+def _labels(labels):
+    def escape(v):
+        return str(v).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _metric(out, name, kind, help, samples):
+    out.append(f"# HELP {name} {help}")
+    out.append(f"# TYPE {name} {kind}")
+    for labels, value in samples:
+        out.append(f"{name}{_labels(labels)} {value}")
+
+
+def _histograms(out, name, help, series):
+    out.append(f"# HELP {name} {help}")
+    out.append(f"# TYPE {name} histogram")
+    for labels, hist in series:
+        snap = hist.snapshot()
+        for bound, count in snap["buckets"].items():
+            out.append(f"{name}_bucket{_labels({**labels, 'le': bound})} {count}")
+        out.append(f"{name}_sum{_labels(labels)} {snap['sum']}")
+        out.append(f"{name}_count{_labels(labels)} {snap['count']}")